@@ -1,12 +1,21 @@
+import os
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
-from io import StringIO
+import plotly.io as pio
+from io import BytesIO
+from html import escape
+from hashlib import blake2b
+from concurrent.futures import ThreadPoolExecutor
 from huggingface_hub import InferenceClient
 
 # --------------------------
 # Streamlit Setup
 # --------------------------
+# Serialize figures with orjson when Streamlit calls fig.to_json()
+pio.json.config.default_engine = "orjson"
+
 st.set_page_config(
     page_title="Team Career Progression Assistant",
     layout="wide"
@@ -22,82 +31,126 @@ st.caption("Program Managers • Scrum Masters • People Leads")
 def load_llm():
     return InferenceClient("google/flan-t5-small")
 
-def generate_llm_plan(row):
-    client = load_llm()
-
-    prompt = f"""
-    You are an expert career coach. Summarize strengths and gaps.
-    Then give a 30-60-90 day plan.
-
-    Profile:
-    Name: {row['Name']}
-    Current Role: {row['CurrentRole']}
-    Years Exp: {row['YearsExperience']}
-    Tech Skills: {row['TechSkillRating']}
-    Soft Skills: {row['SoftSkillRating']}
-    Performance: {row['PerformanceRating']}
-    Leadership: {row['LeadershipInterest']}
-    Domain: {row['DomainInterest']}
-    Career Goal: {row['CareerGoal']}
-    """
+def build_llm_prompts(df):
+    return (
+        "You are a career coach. Give strengths, gaps and a 30-60-90 day plan.\n"
+        + "- Role: " + df["CurrentRole"].astype(str)
+        + "\n- Readiness: " + df["ReadinessScore"].astype(str)
+        + "/100\n- Leadership interest: " + df["LeadershipInterest"].astype(str)
+        + "\n- Domain: " + df["DomainInterest"].astype(str)
+        + "\n- Goal: " + df["CareerGoal"].astype(str)
+        + "\n"
+    )
+
+@st.cache_data(show_spinner=False)
+def fetch_llm_plan(prompt_key, _prompt, _client):
+    # Keyed on the prompt digest; the prompt and client are not hashed by Streamlit.
+    response = _client.text_generation(_prompt, max_new_tokens=128, do_sample=False)
+    return response.strip()
 
-    try:
-        response = client.text_generation(prompt, max_new_tokens=200)
-        return response.strip()
-    except Exception as e:
-        return f"LLM Error: {e}"
+@st.cache_resource
+def llm_executor():
+    return ThreadPoolExecutor(max_workers=8)
+
+def generate_llm_plans(df, retry_failed=True):
+    # Plans run in the background, one future per prompt digest of the
+    # current data; rows whose plan isn't back yet show a placeholder.
+    futures = st.session_state.setdefault("llm_futures", {})
+    client = None
+    errors = {}
+    plans = []
+    pending = False
+
+    prompts = build_llm_prompts(df)
+    prompt_keys = [blake2b(p.encode(), digest_size=16).digest() for p in prompts]
+
+    for prompt, key in zip(prompts, prompt_keys):
+        if key in errors:
+            plans.append(errors[key])
+            continue
+        if key not in futures:
+            if client is None:
+                client = load_llm()
+            futures[key] = llm_executor().submit(fetch_llm_plan, key, prompt, client)
+
+        future = futures[key]
+        if not future.done():
+            plans.append("Generating...")
+            pending = True
+        elif future.exception() is not None:
+            # Report the error for this run, then drop it so the next run retries
+            errors[key] = f"LLM Error: {future.exception()}"
+            plans.append(errors[key])
+            if retry_failed:
+                futures.pop(key)
+        else:
+            plans.append(future.result())
+
+    keys = set(prompt_keys)
+    for key in [k for k in futures if k not in keys]:
+        del futures[key]
+
+    return plans, pending
 
 # --------------------------
 # Compute readiness score
 # --------------------------
-def score(row):
-    years = min(row["YearsExperience"], 10) / 10 * 5
-    tech = row["TechSkillRating"]
-    soft = row["SoftSkillRating"]
-    perf = row["PerformanceRating"]
-    leadership = 5 if str(row["LeadershipInterest"]).lower() == "yes" else 2
+def leadership_mask(df):
+    # Normalize the few distinct answers, then map back to rows by category code
+    lead = df["LeadershipInterest"].astype("category")
+    answers = lead.cat.categories.astype(str).str.strip().str.lower()
+    return np.append(answers.isin(["yes", "y"]), False)[lead.cat.codes.to_numpy()]
+
+def score(df):
+    years = np.minimum(df["YearsExperience"].fillna(0).to_numpy(dtype=float), 10) / 10 * 5
+    tech = df["TechSkillRating"].fillna(0).to_numpy(dtype=float)
+    soft = df["SoftSkillRating"].fillna(0).to_numpy(dtype=float)
+    perf = df["PerformanceRating"].fillna(0).to_numpy(dtype=float)
+    leadership = np.where(leadership_mask(df), 5.0, 2.0)
 
     score_5 = (0.3 * years + 0.2 * tech + 0.2 * soft +
                0.2 * perf + 0.1 * leadership)
-    return round(score_5 / 5 * 100, 1)
+    return np.array([round(v, 1) for v in (score_5 / 5 * 100).tolist()])
 
 # --------------------------
 # Next role + actions
 # --------------------------
-def suggest_next_role(row):
-    s = row["ReadinessScore"]
+def suggest_next_role(df):
+    s = df["ReadinessScore"].to_numpy()
+    role = df["CurrentRole"].astype(object).fillna("Professional").to_numpy(dtype=str)
 
-    if s >= 80:
-        return "Team Lead / Scrum Master"
-    elif s >= 60:
-        return f"Mid-level {row['CurrentRole']}"
-    else:
-        return "Upskill Current Role"
-
-def suggest_actions(row):
-    actions = []
-
-    if row["ReadinessScore"] >= 80:
-        actions = [
-            "Lead small initiatives",
-            "Mentor junior teammates",
-            "Improve decision-making"
-        ]
-    elif row["ReadinessScore"] >= 60:
-        actions = [
-            "Improve core technical skills",
-            "Own a module or feature",
-            "Drive small improvements"
-        ]
-    else:
-        actions = [
-            "Focus on consistency",
-            "Work with mentor weekly",
-            "Upskill using certifications"
-        ]
+    return np.select(
+        [s >= 80, s >= 60],
+        ["Team Lead / Scrum Master", np.char.add("Mid-level ", role)],
+        default="Upskill Current Role"
+    )
 
+def as_bullets(actions):
     return "• " + "\n• ".join(actions)
 
+# Each row's RecommendedActions is one of these three shared strings
+ACTIONS_HIGH = as_bullets((
+    "Lead small initiatives",
+    "Mentor junior teammates",
+    "Improve decision-making"
+))
+ACTIONS_MID = as_bullets((
+    "Improve core technical skills",
+    "Own a module or feature",
+    "Drive small improvements"
+))
+ACTIONS_LOW = as_bullets((
+    "Focus on consistency",
+    "Work with mentor weekly",
+    "Upskill using certifications"
+))
+
+ACTIONS_BY_BAND = np.array([ACTIONS_LOW, ACTIONS_MID, ACTIONS_HIGH], dtype=object)
+
+def suggest_actions(df):
+    band = np.digitize(df["ReadinessScore"].to_numpy(), [60, 80])
+    return pd.Series(ACTIONS_BY_BAND[band], index=df.index, dtype=object)
+
 # --------------------------
 # Sidebar Inputs
 # --------------------------
@@ -112,10 +165,30 @@ with st.sidebar:
 # --------------------------
 # Load data
 # --------------------------
+SAMPLE_PATH = "sample_data/team_members_sample.csv"
+RATING_COLUMNS = ["TechSkillRating", "SoftSkillRating", "PerformanceRating"]
+CATEGORY_COLUMNS = ["CurrentRole", "LeadershipInterest", "DomainInterest", "CareerGoal"]
+
+def downcast(df):
+    # Ratings become int8 when they are whole numbers; repeated text becomes category
+    for col in RATING_COLUMNS:
+        if col in df:
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+    return df.astype({col: "category" for col in CATEGORY_COLUMNS if col in df})
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_csv(digest, _data):
+    return downcast(pd.read_csv(BytesIO(_data)))
+
+@st.cache_data(show_spinner=False)
+def load_sample(path, mtime):
+    return downcast(pd.read_csv(path))
+
 if file:
-    df_raw = pd.read_csv(file)
+    data = file.getvalue()
+    df_raw = load_csv(blake2b(data, digest_size=16).hexdigest(), data)
 elif use_sample:
-    df_raw = pd.read_csv("sample_data/team_members_sample.csv")
+    df_raw = load_sample(SAMPLE_PATH, os.path.getmtime(SAMPLE_PATH))
 else:
     st.stop()
 
@@ -125,13 +198,20 @@ st.dataframe(df_raw, use_container_width=True)
 # --------------------------
 # Calculate Results
 # --------------------------
-df = df_raw.copy()
-df["ReadinessScore"] = df.apply(score, axis=1)
-df["SuggestedNextRole"] = df.apply(suggest_next_role, axis=1)
-df["RecommendedActions"] = df.apply(suggest_actions, axis=1)
-
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_recommendations(df_raw):
+    # assign() evaluates these in order on a single new frame
+    return df_raw.assign(
+        ReadinessScore=score,
+        SuggestedNextRole=lambda df: pd.Categorical(suggest_next_role(df)),
+        RecommendedActions=suggest_actions
+    )
+
+df = build_recommendations(df_raw)
+
+llm_pending = False
 if use_llm:
-    df["LLMPlan"] = df.apply(generate_llm_plan, axis=1)
+    df["LLMPlan"], llm_pending = generate_llm_plans(df)
 else:
     df["LLMPlan"] = "LLM disabled"
 
@@ -150,17 +230,35 @@ st.dataframe(
 # --------------------------
 st.subheader("🧠 Detailed Recommendations")
 
-for _, row in df.iterrows():
-    with st.expander(f"{row['Name']} — {row['SuggestedNextRole']}"):
-        col1, col2 = st.columns(2)
-
-        with col1:
-            st.markdown("### Recommended Actions")
-            st.write(row["RecommendedActions"])
-
-        with col2:
-            st.markdown("### 30-60-90 AI Plan")
-            st.write(row["LLMPlan"])
+def as_html(text):
+    return escape(str(text)).replace("\n", "<br>")
+
+def render_cards(df, plans, pending):
+    # The full run passes fresh plans; only the fragment's own timed reruns re-poll
+    if pending and st.session_state.pop("cards_rendered", False):
+        plans, pending = generate_llm_plans(df, retry_failed=False)
+        if not pending:
+            # Every plan is back: rerun the whole app so the CSV picks them up
+            st.rerun()
+    st.session_state["cards_rendered"] = True
+
+    cards = "".join(
+        f"<details><summary>{as_html(name)} — {as_html(role)}</summary>"
+        "<div style='display:flex;gap:2rem'>"
+        f"<div style='flex:1'><h3>Recommended Actions</h3>{as_html(actions)}</div>"
+        f"<div style='flex:1'><h3>30-60-90 AI Plan</h3>{as_html(plan)}</div>"
+        "</div></details>"
+        for name, role, actions, plan in zip(
+            df["Name"], df["SuggestedNextRole"], df["RecommendedActions"], plans
+        )
+    )
+    st.markdown(cards, unsafe_allow_html=True)
+
+# While plans are pending only this fragment polls; the rest of the page stays put
+st.session_state["cards_rendered"] = False
+st.fragment(render_cards, run_every=1 if llm_pending else None)(
+    df, df["LLMPlan"], llm_pending
+)
 
 # --------------------------
 # Dashboard
@@ -168,28 +266,53 @@ for _, row in df.iterrows():
 st.markdown("---")
 st.header("📈 Team Dashboard")
 
+# Large teams switch to a WebGL scatter; the pie keeps its top roles only.
+WEBGL_MIN_ROWS = 200
+MAX_PIE_ROLES = 8
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_score_chart(chart_df):
+    if len(chart_df) > WEBGL_MIN_ROWS:
+        fig = px.scatter(chart_df, x="Name", y="ReadinessScore", render_mode="webgl")
+    else:
+        fig = px.bar(chart_df, x="Name", y="ReadinessScore", text="ReadinessScore")
+    fig.update_layout(transition={"duration": 0}, uirevision="static")
+    return fig
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_role_chart(chart_df):
+    count = chart_df["SuggestedNextRole"].value_counts()
+    if len(count) > MAX_PIE_ROLES:
+        other = count.iloc[MAX_PIE_ROLES - 1:].sum()
+        count = pd.concat([count.iloc[:MAX_PIE_ROLES - 1], pd.Series({"Other": other})])
+    count = count.reset_index()
+    count.columns = ["Role", "Count"]
+    fig = px.pie(count, names="Role", values="Count")
+    fig.update_layout(transition={"duration": 0}, uirevision="static")
+    return fig
+
+# Only the charted columns feed the cache key, so LLM updates don't rebuild figures
+chart_df = df[["Name", "ReadinessScore", "SuggestedNextRole"]]
+
 col1, col2 = st.columns(2)
 
 with col1:
-    fig = px.bar(df, x="Name", y="ReadinessScore", text="ReadinessScore")
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(build_score_chart(chart_df), use_container_width=True)
 
 with col2:
-    count = df["SuggestedNextRole"].value_counts().reset_index()
-    count.columns = ["Role", "Count"]
-    fig2 = px.pie(count, names="Role", values="Count")
-    st.plotly_chart(fig2, use_container_width=True)
+    st.plotly_chart(build_role_chart(chart_df), use_container_width=True)
 
 
 # --------------------------
 # Download results
 # --------------------------
-buffer = StringIO()
-df.to_csv(buffer, index=False)
+@st.cache_data(show_spinner=False, max_entries=8)
+def to_csv_bytes(df):
+    return df.to_csv(index=False, lineterminator="\n").encode("utf-8")
 
 st.download_button(
     "📥 Download Full Results CSV",
-    buffer.getvalue(),
+    to_csv_bytes(df),
     "career_progression_results.csv",
     "text/csv"
 )